@@ -22,11 +22,12 @@ if os.path.isdir(os.path.join(basedir, "virttest")):
 
 from test_virsh import FakeVirshFactory
 
-from virttest import data_dir, utils_misc, xml_utils
+from virttest import data_dir, utils_misc, virsh, xml_utils
 from virttest.libvirt_xml import (
     accessors,
     base,
     capability_xml,
+    domcapability_xml,
     network_xml,
     nodedev_xml,
     vm_xml,
@@ -53,6 +54,16 @@ type='kvm'><emulator>/usr/libexec/qemu-kvm</emulator></domain></arch><features>
 <cpuselection/><deviceboot/><acpi default='on' toggle='yes'/><apic default='on'
 toggle='no'/></features></guest></capabilities>"""
 CAPABILITIES = _CAPABILITIES % UUID
+DOMCAPABILITIES = """<domainCapabilities><vcpu max='255'/><cpu>
+<mode name='host-passthrough' supported='yes'/><mode name='host-model'
+supported='yes'><model fallback='forbid'>Skylake-Client</model>
+<vendor>Intel</vendor><feature policy='require' name='ss'/><feature
+policy='require' name='hypervisor'/><feature policy='disable' name='pdpe1gb'/>
+<feature policy='require' name='invtsc'/></mode><mode name='custom'
+supported='yes'><model usable='yes'>qemu64</model></mode></cpu><features>
+<gic supported='no'/><hyperv supported='yes'><enum name='features'>
+<value>relaxed</value><value>vapic</value></enum></hyperv></features>
+</domainCapabilities>"""
 
 
 class LibvirtXMLTestBase(unittest.TestCase):
@@ -1128,5 +1139,146 @@ class testPCIXML(LibvirtXMLTestBase):
         self.assertTrue(isinstance(result, dict))
 
 
+class testDomCapabilityXML(LibvirtXMLTestBase):
+    def setUp(self):
+        super(testDomCapabilityXML, self).setUp()
+        self.domcaps_calls = 0
+        self.dummy_virsh.__super_set__("domcapabilities", self._domcapabilities)
+        domcapability_xml.invalidate_domcaps_cache()
+
+    def tearDown(self):
+        domcapability_xml.invalidate_domcaps_cache()
+        super(testDomCapabilityXML, self).tearDown()
+
+    def _domcapabilities(self, options="", **dargs):
+        self.domcaps_calls += 1
+        return process.CmdResult("virsh domcapabilities", DOMCAPABILITIES, "", 0)
+
+    def test_domcaps_cached(self):
+        domcapability_xml.DomCapabilityXML(virsh_instance=self.dummy_virsh)
+        domcaps = domcapability_xml.DomCapabilityXML(virsh_instance=self.dummy_virsh)
+        self.assertEqual(self.domcaps_calls, 1)
+        self.assertEqual(domcaps.max, "255")
+        domcapability_xml.invalidate_domcaps_cache(self.dummy_virsh)
+        domcapability_xml.DomCapabilityXML(virsh_instance=self.dummy_virsh)
+        self.assertEqual(self.domcaps_calls, 2)
+
+    def test_domcaps_cache_remote(self):
+        class RemoteVirsh(virsh.Virsh):
+            __slots__ = ("remote_ip",)
+
+        local_virsh = RemoteVirsh(virsh_exec="/bin/false", uri=None)
+        remote_virsh = RemoteVirsh(
+            virsh_exec="/bin/false", uri=None, remote_ip="192.168.122.2"
+        )
+        for virsh_instance in (local_virsh, remote_virsh):
+            virsh_instance.__super_set__("domcapabilities", self._domcapabilities)
+        domcapability_xml.DomCapabilityXML(virsh_instance=local_virsh)
+        domcapability_xml.DomCapabilityXML(virsh_instance=remote_virsh)
+        self.assertEqual(self.domcaps_calls, 2)
+        domcapability_xml.DomCapabilityXML(virsh_instance=remote_virsh)
+        self.assertEqual(self.domcaps_calls, 2)
+
+    def _patch_libvirt(self, domcaps_xml):
+        """
+        Replace libvirt python bindings by a fake returning domcaps_xml,
+        or failing with libvirtError if it is None
+        """
+        test = self
+
+        class FakeLibvirtError(Exception):
+            pass
+
+        class FakeConnection(object):
+            def getDomainCapabilities(self, *args):
+                test.libvirt_calls += 1
+                if domcaps_xml is None:
+                    raise FakeLibvirtError("no domcapabilities")
+                return domcaps_xml
+
+            def close(self):
+                pass
+
+        class FakeLibvirt(object):
+            libvirtError = FakeLibvirtError
+
+            @staticmethod
+            def open(uri):
+                return FakeConnection()
+
+            openReadOnly = open
+
+        self.libvirt_calls = 0
+        self.addCleanup(
+            setattr, domcapability_xml, "libvirt", domcapability_xml.libvirt
+        )
+        domcapability_xml.libvirt = FakeLibvirt
+        self.addCleanup(setattr, virsh, "domcapabilities", virsh.domcapabilities)
+        virsh.domcapabilities = self._domcapabilities
+
+    def test_domcaps_libvirt_python(self):
+        self._patch_libvirt("\n%s\n" % DOMCAPABILITIES)
+        domcaps = domcapability_xml.DomCapabilityXML()
+        self.assertEqual(domcaps.max, "255")
+        domcapability_xml.DomCapabilityXML()
+        self.assertEqual(self.libvirt_calls, 1)
+        self.assertEqual(self.domcaps_calls, 0)
+        self.assertEqual(
+            domcapability_xml._fetch_domcaps(base.virsh), DOMCAPABILITIES.strip()
+        )
+
+    def test_domcaps_libvirt_python_error(self):
+        self._patch_libvirt(None)
+        domcaps = domcapability_xml.DomCapabilityXML()
+        self.assertEqual(domcaps.max, "255")
+        self.assertEqual(self.libvirt_calls, 1)
+        self.assertEqual(self.domcaps_calls, 1)
+
+    def test_hostmodel(self):
+        domcaps = domcapability_xml.DomCapabilityXML(virsh_instance=self.dummy_virsh)
+        self.assertEqual(domcaps.get_hostmodel_name(), "Skylake-Client")
+        features = domcaps.get_additional_feature_list("host-model", None)
+        self.assertEqual(len(features), 4)
+        self.assertEqual(features[2], {"pdpe1gb": "disable"})
+        self.assertEqual(domcaps.get_additional_feature_list("custom", None), [])
+
+    def test_ignore_features(self):
+        domcaps = domcapability_xml.DomCapabilityXML(virsh_instance=self.dummy_virsh)
+        features = domcaps.get_additional_feature_list("host-model")
+        self.assertNotIn({"invtsc": "require"}, features)
+        features = domcaps.get_additional_feature_list(
+            "host-model", ignore_features=("ss", "pdpe1gb")
+        )
+        self.assertEqual(features, [{"hypervisor": "require"}, {"invtsc": "require"}])
+        features = domcaps.get_additional_features("host-model")
+        self.assertEqual(
+            features, {"ss": "require", "hypervisor": "require", "pdpe1gb": "disable"}
+        )
+        self.assertEqual(domcaps.get_additional_features("no-such-mode"), {})
+
+    def test_hostmodel_info(self):
+        domcaps = domcapability_xml.DomCapabilityXML(virsh_instance=self.dummy_virsh)
+        model_name, features = domcaps.get_hostmodel_info()
+        self.assertEqual(model_name, "Skylake-Client")
+        self.assertEqual(
+            features, {"ss": "require", "hypervisor": "require", "pdpe1gb": "disable"}
+        )
+        cpu_xml = vm_xml.VMCPUXML.from_domcapabilities(domcaps)
+        self.assertEqual(cpu_xml.model, "Skylake-Client")
+        self.assertEqual(cpu_xml.get_feature_name(3), "invtsc")
+
+    def test_enums(self):
+        domcaps = domcapability_xml.DomCapabilityXML(virsh_instance=self.dummy_virsh)
+        self.assertEqual(domcaps.features.get_gic_enums(), [])
+        enums = domcaps.features.get_hyperv_enums()
+        self.assertEqual(len(enums), 1)
+        self.assertEqual(enums[0].name, "features")
+        self.assertEqual([v.value for v in enums[0].values], ["relaxed", "vapic"])
+        # enum instances don't share their tree with domcapabilities
+        enums[0].name = "changed"
+        self.assertEqual(domcaps.features.get_hyperv_enums()[0].name, "features")
+        self.assertRaises(xcepts.LibvirtXMLError, domcaps.features.get_enums, "/hyperv")
+
+
 if __name__ == "__main__":
     unittest.main()
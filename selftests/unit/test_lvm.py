@@ -0,0 +1,346 @@
+#!/usr/bin/python
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from avocado.utils import path, process
+
+# simple magic for using scripts within a source tree
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.isdir(os.path.join(basedir, "virttest")):
+    sys.path.append(basedir)
+
+from virttest import lvm
+from virttest.unittest_utils import mock
+
+GiB = 1024**3
+
+
+class LVMTestBase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="test_lvm_")
+        self.commands = []
+        # command prefix -> list of (stdout, exit_status), used in order
+        self.results = {}
+        self.god = mock.mock_god()
+        self.god.stub_with(path, "find_command", lambda cmd: "/usr/sbin/%s" % cmd)
+        self.god.stub_with(process, "run", self.fake_run)
+        self.god.stub_with(process, "system", self.fake_system)
+
+    def tearDown(self):
+        self.god.unstub_all()
+        shutil.rmtree(self.tmpdir)
+
+    def add_result(self, prefix, stdout="", exit_status=0):
+        self.results.setdefault(prefix, []).append((stdout, exit_status))
+
+    def fake_run(self, cmd, ignore_status=False, **dargs):
+        self.commands.append(cmd)
+        stdout, exit_status = "", 0
+        for prefix, results in self.results.items():
+            if cmd.startswith(prefix) and results:
+                stdout, exit_status = results.pop(0)
+                break
+        result = process.CmdResult(cmd, stdout, "", exit_status)
+        if exit_status and not ignore_status:
+            raise process.CmdError(cmd, result)
+        return result
+
+    def fake_system(self, cmd, ignore_status=False, **dargs):
+        return self.fake_run(cmd, ignore_status=ignore_status).exit_status
+
+    def command_names(self):
+        """
+        Return lvm sub-command, or command name, of the commands run
+        """
+        names = []
+        for cmd in self.commands:
+            if cmd.startswith("lvm "):
+                cmd = cmd[len("lvm ") :]
+            names.append(cmd.split()[0])
+        return names
+
+    def make_file(self, name, content=""):
+        file_path = os.path.join(self.tmpdir, name)
+        dirname = os.path.dirname(file_path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(file_path, "w") as fd:
+            fd.write(content)
+        return file_path
+
+    def new_lvm(self):
+        return lvm.LVM({"image_name": "images/test", "image_size": "1G"})
+
+
+class ReloadTest(LVMTestBase):
+    FULLREPORT = {
+        "report": [
+            {
+                "vg": [{"vg_name": "vg0", "vg_size": str(20 * GiB)}],
+                "pv": [
+                    {"pv_name": "/dev/sdb", "pv_size": str(10 * GiB), "vg_name": "vg0"},
+                    {"pv_name": "/dev/sdc", "pv_size": str(10 * GiB), "vg_name": "vg0"},
+                ],
+                "lv": [{"lv_name": "lv0", "lv_size": str(GiB), "vg_name": "vg0"}],
+            },
+            {
+                "vg": [],
+                "pv": [{"pv_name": "/dev/sdd", "pv_size": str(GiB), "vg_name": ""}],
+                "lv": [],
+            },
+        ]
+    }
+
+    def test_fullreport(self):
+        self.add_result("lvm fullreport", json.dumps(self.FULLREPORT))
+        lvm_obj = self.new_lvm()
+        self.assertEqual(len(self.commands), 1)
+        self.assertEqual(
+            [pv.name for pv in lvm_obj.pvs], ["/dev/sdb", "/dev/sdc", "/dev/sdd"]
+        )
+        self.assertEqual(len(lvm_obj.vgs), 1)
+        vg = lvm_obj.vgs[0]
+        self.assertEqual(vg.size, 20 * GiB)
+        self.assertEqual([pv.name for pv in vg.pvs], ["/dev/sdb", "/dev/sdc"])
+        self.assertIs(lvm_obj.get_vol("/dev/sdc", "pvs").vg, vg)
+        self.assertIsNone(lvm_obj.get_vol("/dev/sdd", "pvs").vg)
+        lv = lvm_obj.get_vol("lv0", "lvs")
+        self.assertIs(lv.vg, vg)
+        self.assertEqual(vg.lvs, [lv])
+        self.assertEqual(lv.path, "/dev/vg0/lv0")
+
+    def check_fallback(self):
+        self.add_result("lvm pvs", "/dev/sdb %s\n" % (10 * GiB))
+        self.add_result("lvm vgs", "/dev/sdb vg0 %s\n" % (10 * GiB))
+        self.add_result("lvm lvs", "lv0 %s vg0\n" % GiB)
+        lvm_obj = self.new_lvm()
+        self.assertEqual(
+            self.command_names(),
+            ["fullreport", "pvs", "vgs", "lvs"],
+        )
+        self.assertEqual([pv.name for pv in lvm_obj.pvs], ["/dev/sdb"])
+        self.assertEqual([vg.name for vg in lvm_obj.vgs], ["vg0"])
+        self.assertIs(lvm_obj.pvs[0].vg, lvm_obj.vgs[0])
+        self.assertIs(lvm_obj.lvs[0].vg, lvm_obj.vgs[0])
+
+    def test_fullreport_failed(self):
+        self.add_result("lvm fullreport", "", 3)
+        self.check_fallback()
+
+    def test_fullreport_bad_json(self):
+        self.add_result("lvm fullreport", "  Unknown command fullreport")
+        self.check_fallback()
+
+
+class VolumeGroupCreateTest(LVMTestBase):
+    def setUp(self):
+        super(VolumeGroupCreateTest, self).setUp()
+        self.god.stub_with(lvm, "_get_mount_index", lambda: {})
+        self.pvs = []
+        for name in ("sdb", "sdc"):
+            pv = lvm.PhysicalVolume(self.make_file(name), 0)
+            pv.create(defer=True)
+            self.pvs.append(pv)
+        self.vg = lvm.VolumeGroup("vg0", 0, self.pvs)
+
+    def test_vgcreate_new_pvs(self):
+        self.vg.create()
+        self.assertEqual(len(self.commands), 1)
+        self.assertTrue(self.commands[0].startswith("lvm vgcreate"))
+        self.assertFalse(any(pv.deferred for pv in self.pvs))
+
+    def test_pvcreate_retry(self):
+        self.add_result("lvm vgcreate", "", 5)
+        self.vg.create()
+        self.assertEqual(
+            self.command_names(),
+            ["vgcreate", "pvcreate", "pvcreate", "vgcreate"],
+        )
+        self.assertFalse(any(pv.deferred for pv in self.pvs))
+
+    def test_pvcreate_retry_failed(self):
+        self.add_result("lvm vgcreate", "", 5)
+        self.add_result("lvm vgcreate", "", 5)
+        self.assertRaises(process.CmdError, self.vg.create)
+
+
+class AttrCacheTest(LVMTestBase):
+    def setUp(self):
+        super(AttrCacheTest, self).setUp()
+        self.pv = lvm.PhysicalVolume("/dev/sdb", 10 * GiB)
+        self.vg = lvm.VolumeGroup("vg0", 10 * GiB, [self.pv])
+        self.pv.set_vg(self.vg)
+        self.lv = lvm.LogicalVolume("lv0", GiB, self.vg)
+
+    def test_attr_cached(self):
+        self.add_result("lvm vgs", "%s\n" % (10 * GiB))
+        self.assertEqual(self.vg.get_attr("vg_free"), str(10 * GiB))
+        self.assertEqual(self.vg.get_attr("vg_free"), str(10 * GiB))
+        self.assertEqual(len(self.commands), 1)
+
+    def test_lv_changes_vg(self):
+        self.add_result("lvm vgs", "%s\n" % (10 * GiB))
+        self.add_result("lvm vgs", "%s\n" % (9 * GiB))
+        self.add_result("lvm vgs", "%s\n" % (10 * GiB))
+        self.assertEqual(self.vg.get_attr("vg_free"), str(10 * GiB))
+        self.lv.create()
+        self.assertEqual(self.vg.get_attr("vg_free"), str(9 * GiB))
+        self.lv.remove()
+        self.assertEqual(self.vg.get_attr("vg_free"), str(10 * GiB))
+
+    def test_vg_changes_pv(self):
+        self.add_result("lvm pvs", "vg0\n")
+        self.assertEqual(self.pv.get_attr("vg_name"), "vg0")
+        self.vg.reduce_pv(self.pv)
+        self.assertIsNone(self.pv.get_attr("vg_name"))
+        self.add_result("lvm pvs", "vg0\n")
+        self.vg.extend_pv(self.pv)
+        self.assertEqual(self.pv.get_attr("vg_name"), "vg0")
+
+    def test_vg_exists_not_cached(self):
+        self.add_result("lvm vgs", "vg0\n")
+        self.assertTrue(self.vg.exists())
+        self.add_result("lvm vgs", "", 5)
+        self.assertFalse(self.vg.exists())
+
+
+class CleanupTest(LVMTestBase):
+    def setUp(self):
+        super(CleanupTest, self).setUp()
+        self.god.stub_with(lvm, "CLEANUP_WORKERS", 4)
+        self.lvm = lvm.LVM(
+            {
+                "image_name": "images/test",
+                "image_size": "1G",
+                "force_remove_image": "yes",
+            }
+        )
+        self.lvm.remove_volume = self.fake_remove_volume
+        self.events = []
+        self.events_lock = threading.Lock()
+        self.failing = None
+        pvs = [lvm.PhysicalVolume("/dev/sd%s" % x, GiB) for x in "bc"]
+        vg = lvm.VolumeGroup("vg0", 2 * GiB, pvs)
+        lvs = [lvm.LogicalVolume("lv%s" % x, GiB, vg) for x in range(3)]
+        # registered in creation order, cleanup goes backwards by kind
+        for vol in pvs + [vg] + lvs:
+            self.lvm.register(vol)
+
+    def fake_remove_volume(self, vol, mount_index=None):
+        with self.events_lock:
+            self.events.append(("start", vol.name))
+        # let the removals of a batch overlap
+        time.sleep(0.05 if vol.name == "lv0" else 0.01)
+        with self.events_lock:
+            self.events.append(("end", vol.name))
+        if vol is self.failing:
+            raise process.CmdError("lvm lvremove")
+        self.lvm.unregister(vol)
+
+    def test_order(self):
+        self.lvm.cleanup()
+        self.assertEqual(self.lvm.trash, [])
+        self.assertEqual(len(self.events), 12)
+        kinds = ("lv", "vg0", "/dev/sd")
+        for index, kind in enumerate(kinds[:-1]):
+            last_end = max(
+                pos
+                for pos, event in enumerate(self.events)
+                if event[0] == "end" and event[1].startswith(kind)
+            )
+            first_start = min(
+                pos
+                for pos, event in enumerate(self.events)
+                if event[0] == "start" and event[1].startswith(kinds[index + 1])
+            )
+            self.assertLess(last_end, first_start)
+
+    def test_error_joins_batch(self):
+        self.failing = self.lvm.trash[-1]
+        self.assertRaises(process.CmdError, self.lvm.cleanup)
+        self.assertEqual(
+            sorted(name for event, name in self.events if event == "end"),
+            ["lv0", "lv1", "lv2"],
+        )
+        self.assertNotIn(("start", "vg0"), self.events)
+
+
+class LoopDevicesTest(LVMTestBase):
+    def setUp(self):
+        super(LoopDevicesTest, self).setUp()
+        self.image = os.path.realpath(self.make_file("image.raw"))
+        self.sysfs = os.path.join(self.tmpdir, "sys")
+        self.real_glob = lvm.glob.glob
+        self.god.stub_with(lvm.glob, "glob", self.fake_glob)
+
+    def fake_glob(self, pattern):
+        return self.real_glob(pattern.replace("/sys", self.sysfs, 1))
+
+    def test_sysfs(self):
+        for dev, backing_file in (
+            ("loop10", self.image),
+            ("loop1", "/var/lib/other.raw"),
+            ("loop0", self.image),
+        ):
+            self.make_file("sys/block/%s/loop/backing_file" % dev, backing_file + "\n")
+        self.make_file("sys/block/loop2/size", "0\n")
+        self.assertEqual(
+            lvm._find_loop_devices(self.image), ["/dev/loop0", "/dev/loop10"]
+        )
+        self.assertEqual(self.commands, [])
+
+    def test_losetup(self):
+        self.add_result("losetup -j", "/dev/loop3: [2049]:12 (%s)\n" % self.image)
+        self.assertEqual(lvm._find_loop_devices(self.image), ["/dev/loop3"])
+        self.assertEqual(self.commands, ["losetup -j %s" % self.image])
+
+
+class MountIndexTest(LVMTestBase):
+    def setUp(self):
+        super(MountIndexTest, self).setUp()
+        self.dev = self.make_file("sdb1")
+        mounts = (
+            "proc /proc proc rw 0 0\n"
+            "%s /mnt/a ext4 rw 0 0\n"
+            "/dev/no-such-device /mnt/b xfs rw 0 0\n"
+            "%s /mnt/c ext4 rw 0 0\n" % (self.dev, self.dev)
+        )
+        mounts_file = self.make_file("mounts", mounts)
+        real_open = open
+
+        def fake_open(file_path, *args, **dargs):
+            if file_path == "/proc/mounts":
+                file_path = mounts_file
+            return real_open(file_path, *args, **dargs)
+
+        self.god.stub_with(lvm, "open", fake_open)
+
+    def test_mount_index(self):
+        st = os.stat(self.dev)
+        self.assertEqual(
+            lvm._get_mount_index(), {(st.st_dev, st.st_ino): ["/mnt/a", "/mnt/c"]}
+        )
+
+    def test_umount(self):
+        mount_index = lvm._get_mount_index()
+        volume = lvm.Volume(self.dev, 0)
+        volume.umount(mount_index=mount_index)
+        # mount points, not filesystem types, are unmounted
+        self.assertEqual(self.commands, ["umount -f /mnt/a", "umount -f /mnt/c"])
+        self.assertEqual(mount_index, {})
+        volume.umount(mount_index=mount_index)
+        self.assertEqual(len(self.commands), 2)
+
+    def test_umount_reads_mounts(self):
+        lvm.Volume(self.dev, 0).umount()
+        self.assertEqual(self.commands, ["umount -f /mnt/a", "umount -f /mnt/c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
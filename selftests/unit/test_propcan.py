@@ -196,6 +196,19 @@ class TestPropCanBase(unittest.TestCase):
         testdict.update(**kwargs)
         self.assertEqual(testdict, kwargs)
 
+    def test_subclass_all_slots(self):
+        class FooBar(propcan.PropCanBase):
+            __slots__ = ("foo",)
+
+        class BazQux(FooBar):
+            __slots__ = ("baz",)
+
+        self.assertEqual(FooBar(foo="bar").__all_slots__, ("foo",))
+        testcan = BazQux(foo="bar", baz="qux")
+        self.assertEqual(sorted(testcan.__all_slots__), ["baz", "foo"])
+        self.assertEqual(testcan["baz"], "qux")
+        self.assertEqual(FooBar.__all_slots__, ("foo",))
+
 
 class TestPropCan(unittest.TestCase):
     def setUp(self):
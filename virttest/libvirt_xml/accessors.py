@@ -212,8 +212,11 @@ class AccessorGeneratorBase(object):
         """
         Setup a callable instance for operation only if not already defined
         """
-        # Don't overwrite methods in libvirtxml instance
-        if not hasattr(self.libvirtxml, self.accessor_name(operation)):
+        # Don't overwrite methods in libvirtxml instance.  Skip hasattr(),
+        # PropCanBase.__getattr__ builds a detailed KeyError for each miss.
+        try:
+            self.libvirtxml.__super_get__(self.accessor_name(operation))
+        except AttributeError:
             if operation not in self.forbidden:
                 self.assign_callable(operation, self.make_callable(operation))
             else:  # operation is forbidden
@@ -3,13 +3,108 @@ Module simplifying manipulation of XML described at
 http://libvirt.org/formatdomaincaps.html
 """
 
+import copy
 import logging
+import sys
 
-from virttest import xml_utils
 from virttest.libvirt_xml import accessors, base, xcepts
 
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
 LOG = logging.getLogger("avocado." + __name__)
 
+# Selectors of the domcapabilities elements queried below
+_MODE_XPATH = "/cpu/mode[@name='%s']"
+_HOSTMODEL_XPATH = _MODE_XPATH % "host-model"
+_HOSTMODEL_MODEL_XPATH = _HOSTMODEL_XPATH + "/model"
+_GIC_ENUM_XPATH = "/gic/enum"
+_HYPERV_ENUM_XPATH = "/hyperv/enum"
+
+# "virsh domcapabilities" output, keyed by the connection properties
+_DOMCAPS_CACHE = {}
+
+
+def _domcaps_cache_key(virsh_instance):
+    """
+    Return the cache key identifying the connection of virsh_instance
+
+    Remote and unprivileged sessions may leave uri unset, so they are
+    told apart from the local connection by their session properties.
+    """
+    return (
+        getattr(virsh_instance, "uri", None),
+        getattr(virsh_instance, "readonly", False),
+        getattr(virsh_instance, "remote_ip", None),
+        getattr(virsh_instance, "remote_user", None),
+        getattr(virsh_instance, "unprivileged_user", None),
+    )
+
+
+def _libvirt_domcaps(uri=None, readonly=False):
+    """
+    Return domcapabilities XML string from libvirt python bindings
+
+    :param uri: libvirt connection URI, None for the default one
+    :param readonly: True to open a read-only connection
+    :return: XML string, or None if the bindings are unavailable or failed
+    """
+    if libvirt is None:
+        return None
+    try:
+        if readonly:
+            conn = libvirt.openReadOnly(uri)
+        else:
+            conn = libvirt.open(uri)
+        try:
+            return conn.getDomainCapabilities(None, None, None, None, 0).strip()
+        finally:
+            conn.close()
+    except libvirt.libvirtError as detail:
+        LOG.debug("Falling back to virsh for domcapabilities: %s", detail)
+        return None
+
+
+def _fetch_domcaps(virsh_instance, use_libvirt_python=False):
+    """
+    Return domcapabilities XML string, running virsh only on cache miss
+
+    :param virsh_instance: virsh module or Virsh class instance
+    :param use_libvirt_python: True to try libvirt python bindings first
+    :return: XML string of virsh domcapabilities output
+    """
+    key = _domcaps_cache_key(virsh_instance)
+    try:
+        return _DOMCAPS_CACHE[key]
+    except KeyError:
+        pass
+    if use_libvirt_python:
+        xml = _libvirt_domcaps(*key[:2])
+        if xml is not None:
+            _DOMCAPS_CACHE[key] = xml
+            return xml
+    result = virsh_instance.domcapabilities()
+    xml = result.stdout_text.strip()
+    # Don't remember failures, the next caller should retry
+    if result.exit_status == 0:
+        _DOMCAPS_CACHE[key] = xml
+    return xml
+
+
+def invalidate_domcaps_cache(virsh_instance=None):
+    """
+    Drop cached domcapabilities output
+
+    :param virsh_instance: only drop the entry of this connection,
+                           None to drop all entries
+    """
+    if virsh_instance is None:
+        _DOMCAPS_CACHE.clear()
+    else:
+        _DOMCAPS_CACHE.pop(_domcaps_cache_key(virsh_instance), None)
+
 
 class DomCapabilityXML(base.LibvirtXMLBase):
     """
@@ -23,6 +118,11 @@ class DomCapabilityXML(base.LibvirtXMLBase):
     __slots__ = ("features", "max")
     __schema_name__ = "domcapabilities"
 
+    # Query libvirt python bindings, when installed, instead of running
+    # virsh.  Only applies to the default virsh module, Virsh instances
+    # may wrap sessions or remote hosts the bindings know nothing about.
+    USE_LIBVIRT_PYTHON = True
+
     def __init__(self, virsh_instance=base.virsh):
         accessors.XMLElementNest(
             property_name="features",
@@ -36,8 +136,11 @@ class DomCapabilityXML(base.LibvirtXMLBase):
             "max", self, parent_xpath="/", tag_name="vcpu", attribute="max"
         )
         super(DomCapabilityXML, self).__init__(virsh_instance)
-        result = self.__dict_get__("virsh").domcapabilities()
-        self["xml"] = result.stdout_text.strip()
+        virsh_instance = self.__dict_get__("virsh")
+        self["xml"] = _fetch_domcaps(
+            virsh_instance,
+            use_libvirt_python=self.USE_LIBVIRT_PYTHON and virsh_instance is base.virsh,
+        )
 
     def get_additional_feature_list(self, cpu_mode_name, ignore_features=("invtsc",)):
         """
@@ -68,29 +171,50 @@ class DomCapabilityXML(base.LibvirtXMLBase):
             <feature policy="require" name="invtsc"/>
         </mode>
 
+        New code should prefer get_additional_features(), which returns
+        the same data as a single dict.
+
         :param cpu_mode_name: cpu mode name, must be 'host-model' since libvirt3.9
         :param ignore_features: features that need to be ignored
         :return: list of features, feature is dict-like, feature name is set to dict key,
                  feature policy is set to dict value.
                  returen is like [{'ss': 'require'}, {'pdpe1gb', 'require'}]
         """
-        feature_list = []  # [{feature1: policy}, {feature2: policy}, ...]
+        features = self.get_additional_features(cpu_mode_name, ignore_features)
+        return [{name: policy} for name, policy in features.items()]
+
+    def get_additional_features(self, cpu_mode_name, ignore_features=("invtsc",)):
+        """
+        Get additional CPU features which explicitly specified by <feature>
+        tag in cpu/mode[@name=cpu_mode_name] part of virsh domcapabilities.
+
+        See get_additional_feature_list() for details about the features.
+
+        :param cpu_mode_name: cpu mode name, must be 'host-model' since libvirt3.9
+        :param ignore_features: features that need to be ignored
+        :return: dict of feature name to feature policy,
+                 like {'ss': 'require', 'pdpe1gb': 'require'}
+        """
         xmltreefile = self.__dict_get__("xml")
-        try:
-            for mode_node in xmltreefile.findall("/cpu/mode"):
-                # Get mode which name attribute is 'host-model'
-                if mode_node.get("name") == cpu_mode_name:
-                    for feature in mode_node.findall("feature"):
-                        item = {}
-                        item[feature.get("name")] = feature.get("policy")
-                        if ignore_features and item in ignore_features:
-                            continue
-                        feature_list.append(item)
-        except AttributeError as elem_attr:
-            LOG.warning("Failed to find attribute %s" % elem_attr)
-            feature_list = []
-        finally:
-            return feature_list
+        # Mode names are unique, find() stops scanning at the first match
+        mode_node = xmltreefile.find(_MODE_XPATH % cpu_mode_name)
+        if mode_node is None:
+            return {}
+        return self._get_mode_features(mode_node, ignore_features)
+
+    @staticmethod
+    def _get_mode_features(mode_node, ignore_features):
+        """
+        Return dict of feature name to policy of <feature> tags in mode_node
+        """
+        ignore_set = frozenset(ignore_features or ())
+        features = {}
+        for feature in mode_node.iterfind("feature"):
+            name = feature.get("name", "")
+            if name not in ignore_set:
+                # Small fixed vocabulary, share the strings across parses
+                features[sys.intern(name)] = sys.intern(feature.get("policy", ""))
+        return features
 
     def get_hostmodel_name(self):
         """
@@ -133,13 +257,32 @@ class DomCapabilityXML(base.LibvirtXMLBase):
         :return: modelname string
         """
         xmltreefile = self.__dict_get__("xml")
-        try:
-            for mode_node in xmltreefile.findall("/cpu/mode"):
-                if mode_node.get("name") == "host-model":
-                    return mode_node.find("model").text
-        except AttributeError as elem_attr:
-            LOG.warning("Failed to find attribute %s" % elem_attr)
+        # Stops at the first match, don't turn this into a findall() scan
+        model = xmltreefile.find(_HOSTMODEL_MODEL_XPATH)
+        if model is None:
+            LOG.warning("Failed to find host-model CPU model in domcapabilities")
             return ""
+        return model.text
+
+    def get_hostmodel_info(self, ignore_features=("invtsc",)):
+        """
+        Get CPU modelname and additional CPU features of the host-model
+        mode in a single pass over virsh domcapabilities.
+
+        See get_hostmodel_name() and get_additional_features() for
+        details about the values.
+
+        :param ignore_features: features that need to be ignored
+        :return: tuple of (modelname string, dict of feature name to policy)
+                 like ('Skylake-Client', {'ss': 'require', 'pdpe1gb': 'require'})
+        """
+        mode_node = self.__dict_get__("xml").find(_HOSTMODEL_XPATH)
+        model_name = "" if mode_node is None else mode_node.findtext("model", "")
+        if not model_name:
+            LOG.warning("Failed to find host-model CPU model in domcapabilities")
+        if mode_node is None:
+            return model_name, {}
+        return model_name, self._get_mode_features(mode_node, ignore_features)
 
 
 class DomCapFeaturesXML(base.LibvirtXMLBase):
@@ -182,13 +325,13 @@ class DomCapFeaturesXML(base.LibvirtXMLBase):
         """
         Return EnumXML instance list of gic
         """
-        return self.get_enums("/gic/enum")
+        return self.get_enums(_GIC_ENUM_XPATH)
 
     def get_hyperv_enums(self):
         """
         Return EnumXML instance list of hyperv
         """
-        return self.get_enums("/hyperv/enum")
+        return self.get_enums(_HYPERV_ENUM_XPATH)
 
     def get_enums(self, path):
         """
@@ -196,13 +339,11 @@ class DomCapFeaturesXML(base.LibvirtXMLBase):
 
         :param path: str, like '/gic/enum', '/hyperv/enum'
         """
-        enum_list = []
-        for enum_node in self.xmltreefile.findall(path):
-            xml_str = xml_utils.ElementTree.tostring(enum_node, encoding="unicode")
-            new_enum = EnumXML()
-            new_enum.xml = xml_str
-            enum_list.append(new_enum)
-        return enum_list
+        virsh_instance = self.__dict_get__("virsh")
+        return [
+            EnumXML.new_from_element(enum_node, virsh_instance=virsh_instance)
+            for enum_node in self.xmltreefile.iterfind(path)
+        ]
 
 
 class ValueXML(base.LibvirtXMLBase):
@@ -252,6 +393,25 @@ class EnumXML(base.LibvirtXMLBase):
         super(EnumXML, self).__init__(virsh_instance=virsh_instance)
         self.xml = "<enum/>"
 
+    @classmethod
+    def new_from_element(cls, element, virsh_instance=base.virsh):
+        """
+        Create a new EnumXML instance from an enum ElementTree element
+
+        The element is copied into the instance tree directly, instead
+        of being serialized and parsed again.
+        """
+        if element.tag != "enum":
+            raise xcepts.LibvirtXMLError(
+                "Refusing to create %s instance "
+                "from %s tagged element" % (cls.__name__, element.tag)
+            )
+        instance = cls(virsh_instance=virsh_instance)
+        instance.xmltreefile._setroot(copy.deepcopy(element))
+        instance.xmltreefile.write()
+        instance.xmltreefile.flush()
+        return instance
+
     @staticmethod
     def marshal_from_values(item, index, libvirtxml):
         """
@@ -503,7 +503,7 @@ class PoolXML(PoolXMLBase):
             backup.pool_define()
             raise xcepts.LibvirtXMLError(error_msg + "%s" % detail)
         if not poolxml.pool_define():
-            LOG.info("Pool xml: %s" % poolxml.get("xml"))
+            LOG.info("Pool xml: %s", poolxml.get("xml"))
             _cleanup(details="Define pool %s failed" % new_name)
         if start_pool:
             pool_ins.start_pool(new_name)
@@ -1792,7 +1792,7 @@ class VMXML(VMXMLBase):
             graphic = [xml_utils.ElementTree.SubElement(devices, "graphics")]
             graphic[0].set("type", "vnc")
         for key in attr:
-            LOG.debug("Set %s='%s'" % (key, attr[key]))
+            LOG.debug("Set %s='%s'", key, attr[key])
             graphic[index].set(key, attr[key])
         vmxml.sync(virsh_instance=virsh_instance)
 
@@ -2485,13 +2485,10 @@ class VMCPUXML(base.LibvirtXMLBase):
         :return: None
         """
         cpu_xml = VMCPUXML()
-        cpu_xml["model"] = domcaps_xml.get_hostmodel_name()
-        features = domcaps_xml.get_additional_feature_list(
-            "host-model", ignore_features=None
-        )
-        for feature in features:
-            for feature_name, feature_policy in feature.items():
-                cpu_xml.add_feature(feature_name, policy=feature_policy)
+        model_name, features = domcaps_xml.get_hostmodel_info(ignore_features=None)
+        cpu_xml["model"] = model_name
+        for feature_name, feature_policy in features.items():
+            cpu_xml.add_feature(feature_name, policy=feature_policy)
 
         return cpu_xml
 
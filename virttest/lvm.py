@@ -20,14 +20,28 @@ Required params:
         LogicalVolume group name, eg, "test_vg";
     pv_name
         PhysicalVolume name eg, /dev/sdb or /dev/sdb1;
+
+Optional params:
+    lvm_prime_cache
+        "yes" to run "lvm pvscan --cache" before querying existing
+        volumes, default "no";
+    emulated_image_sparse
+        "yes" to create the EmulatedLVM image file sparse instead of
+        preallocating it, default "no";
 """
 
 from __future__ import division
 
+import errno
+import functools
+import glob
+import json
 import logging
 import math
 import os
+import random
 import re
+import threading
 import time
 
 from avocado.core import exceptions
@@ -39,45 +53,148 @@ LOG = logging.getLogger("avocado." + __name__)
 
 UNIT = "B"
 COMMON_OPTS = "--noheading --nosuffix --unit=%s" % UNIT
+FULLREPORT_CMD = (
+    "lvm fullreport --reportformat json --nosuffix --unit=%s"
+    " --configreport pv -o pv_name,pv_size,vg_name"
+    " --configreport vg -o vg_name,vg_size"
+    " --configreport lv -o lv_name,lv_size,vg_name" % UNIT
+)
+
+_SIZE_TAIL_RE = re.compile(r".*\d$")
+_LV_PATH_RE = re.compile(r"/dev/([\w_]+)/([\w_]+)")
+_ID_SUB_RE = re.compile(r"[-./]")
+_LOOP_DEV_RE = re.compile(r"(/dev/loop\d+)", re.M | re.I)
+# Default regular expression reading volume attributes
+_ATTR_RE = re.compile(r"[\w/]+")
+
+# Max number of volumes removed concurrently by LVM.cleanup
+CLEANUP_WORKERS = min(8, os.cpu_count() or 1)
+# Seconds a reload by LVM.rescan stays valid if no volume changed since
+RESCAN_INTERVAL = 5.0
 
 
 def normalize_data_size(size):
-    if re.match(".*\d$", str(size)):
+    if _SIZE_TAIL_RE.match(str(size)):
         size = "%s%s" % (size, UNIT)
     size = float(utils_misc.normalize_data_size(size, UNIT, 1024))
     return int(math.ceil(size))
 
 
-def cmd_output(cmd, res="[\w/]+"):
+@functools.lru_cache(maxsize=None)
+def _find_command(cmd):
+    """
+    Cached path.find_command(), failed lookups raise and are not cached;
+    """
+    return path.find_command(cmd)
+
+
+@functools.lru_cache(maxsize=256)
+def _image_id(image_name):
+    """
+    Create volume name prefix of image_name;
+    """
+    return _ID_SUB_RE.sub("_", os.path.basename(image_name))
+
+
+def cmd_output(cmd, res=_ATTR_RE):
     result = process.run(cmd, ignore_status=True)
     if result.exit_status != 0:
         LOG.warning(result)
         return None
     output = result.stdout_text
+    if isinstance(res, str):
+        res = re.compile(res)
     for line in output.splitlines():
-        val = re.findall(res, line)
+        val = res.findall(line)
         if val:
             return val[0]
     return None
 
 
+def cached_cmd_output(cache, key, cmd, res=_ATTR_RE):
+    """
+    Return cache[key], filling it from cmd_output(cmd, res) on miss;
+
+    None results are not cached, the attribute may show up later;
+    """
+    try:
+        return cache[key]
+    except KeyError:
+        pass
+    val = cmd_output(cmd, res)
+    if val is not None:
+        cache[key] = val
+    return val
+
+
+def _get_mount_index():
+    """
+    Index mount points of the devices listed in /proc/mounts;
+
+    :return: dict maps (st_dev, st_ino) of device to list of mount points
+    """
+    index = {}
+    with open("/proc/mounts", "r") as fd:
+        for line in fd:
+            dev, mount_point = line.split()[:2]
+            if not dev.startswith("/"):
+                continue
+            try:
+                st = os.stat(dev)
+            except OSError:
+                continue
+            index.setdefault((st.st_dev, st.st_ino), []).append(mount_point)
+    return index
+
+
+def _find_loop_devices(img_file):
+    """
+    Find loop devices backed by the image file;
+
+    Read the backing files from sysfs, use losetup only when sysfs doesn't
+    show loop devices (eg, in some containers);
+
+    :param img_file: image file path;
+    :return: list of loop device paths;
+    """
+    if not glob.glob("/sys/block/loop*"):
+        output = process.run("losetup -j %s" % img_file).stdout_text
+        return _LOOP_DEV_RE.findall(output)
+    img_file = os.path.realpath(img_file)
+    devices = []
+    for backing_file in glob.glob("/sys/block/loop*/loop/backing_file"):
+        try:
+            with open(backing_file, "r") as fd:
+                if fd.read().strip() != img_file:
+                    continue
+        except IOError:
+            continue
+        dev = os.path.basename(os.path.dirname(os.path.dirname(backing_file)))
+        devices.append(dev)
+    devices.sort(key=lambda dev: int(dev[len("loop") :]))
+    return ["/dev/%s" % dev for dev in devices]
+
+
 class Volume(object):
     def __init__(self, name, size):
         self.name = name
         self.path = name
         self.size = normalize_data_size(size)
+        # Attributes already read from lvm, dropped when volume changes
+        self._attr_cache = {}
 
-    def get_attr(self, cmd, attr, res="[\w/]+"):
+    def get_attr(self, cmd, attr, res=_ATTR_RE):
         """
         Get attribute of volume, if not found return None;
 
         :param cmd: command used to display volume info;
         :param attr: attribute name of the volume;
-        :param res: regular expression to reading the attribute;
+        :param res: regular expression (string or compiled) to reading
+                    the attribute;
         :return: string or None
         """
         if attr:
-            return cmd_output(cmd, res)
+            return cached_cmd_output(self._attr_cache, attr, cmd, res)
         return None
 
     def exists(self):
@@ -86,39 +203,50 @@ class Volume(object):
         """
         return os.path.exists(self.path)
 
-    def umount(self, extra_args="-f"):
+    def umount(self, extra_args="-f", mount_index=None):
         """
         Unmount volume;
+
+        :param extra_args: extra arguments for umount command;
+        :param mount_index: index from _get_mount_index(), built from
+                            /proc/mounts if not given; unmounted entries
+                            are dropped from it;
         """
         if self.exists():
-            cmd = "umount %s" % extra_args
-            fd = open("/proc/mounts", "r")
-            mount_list = fd.readlines()
-            fd.close()
-            for line in mount_list:
-                dev, mount_point = line.split()[0], line.split()[2]
-                if os.path.exists(dev) and os.path.samefile(dev, self.path):
-                    process.system("%s %s" % (cmd, mount_point))
+            if mount_index is None:
+                mount_index = _get_mount_index()
+            st = os.stat(self.path)
+            for mount_point in mount_index.pop((st.st_dev, st.st_ino), []):
+                process.system("umount %s %s" % (extra_args, mount_point))
 
 
 class PhysicalVolume(Volume):
     def __init__(self, name, size):
         super(PhysicalVolume, self).__init__(name, size)
         self.vg = None
+        # Device left to be initialized by vgcreate, see create()
+        self.deferred = False
 
-    def create(self, extra_args="-ff --yes"):
+    def create(self, extra_args="-ff --yes", defer=False):
         """
         Create physical volume on specify physical volume;
 
         :param extra_args: extra arguments for pvcreate command;
+        :param defer: only prepare the device, vgcreate of the new
+                      VolumeGroup it joins will initialize it;
         :raise: CmdError or TestError;
         :return: physical volume abspath
         """
         if not self.exists():
             raise exceptions.TestError("Physical device not found")
         self.umount()
+        if defer:
+            self.deferred = True
+            return self.path
         cmd = "pvcreate %s %s" % (extra_args, self.name)
         process.system(cmd)
+        self.deferred = False
+        self._attr_cache.clear()
         LOG.info("Create physical volume: %s", self.name)
         return self.path
 
@@ -131,6 +259,7 @@ class PhysicalVolume(Volume):
         """
         cmd = "lvm pvremove %s %s" % (extra_args, self.name)
         process.system(cmd)
+        self._attr_cache.clear()
         LOG.info("logical physical volume (%s) removed", self.name)
 
     def resize(self, size, extra_args="-ff --yes"):
@@ -148,6 +277,9 @@ class PhysicalVolume(Volume):
             self.name,
         )
         process.system(cmd)
+        self._attr_cache.clear()
+        if self.vg is not None:
+            self.vg._attr_cache.clear()
         self.size = size
         LOG.info("resize volume %s to %s B" % (self.name, self.size))
 
@@ -186,6 +318,7 @@ class VolumeGroup(object):
         self.size = normalize_data_size(size)
         self.pvs = pvs
         self.lvs = []
+        self._attr_cache = {}
 
     def create(self, extra_args="-ff --yes"):
         """
@@ -203,7 +336,20 @@ class VolumeGroup(object):
                 except Exception:
                     pv.vg.remove()
             cmd += " %s" % pv.name
-        process.system(cmd)
+        deferred_pvs = [pv for pv in self.pvs if pv.deferred]
+        if deferred_pvs:
+            # vgcreate initializes new physical volumes itself, but older
+            # lvm2 refuses to, so pvcreate them and retry in that case
+            if process.system(cmd, ignore_status=True) != 0:
+                LOG.debug("vgcreate failed on new pvs, pvcreate them first")
+                for pv in deferred_pvs:
+                    pv.create()
+                process.system(cmd)
+            for pv in deferred_pvs:
+                pv.deferred = False
+        else:
+            process.system(cmd)
+        self._clear_attr_cache(self.pvs)
         LOG.info("Create new volumegroup %s", self.name)
         return self.name
 
@@ -215,6 +361,7 @@ class VolumeGroup(object):
         """
         cmd = "lvm vgremove %s %s" % (extra_args, self.name)
         process.system(cmd)
+        self._clear_attr_cache(self.pvs)
         LOG.info("logical volume-group(%s) removed", self.name)
 
     def get_attr(self, attr):
@@ -225,7 +372,17 @@ class VolumeGroup(object):
         :return: string or None;
         """
         cmd = "lvm vgs -o %s %s %s" % (attr, COMMON_OPTS, self.name)
-        return cmd_output(cmd)
+        return cached_cmd_output(self._attr_cache, attr, cmd)
+
+    def _clear_attr_cache(self, pvs=()):
+        """
+        Drop cached attributes of the VolumeGroup and the given pvs;
+
+        :param pvs: PhysicalVolume objects changed along with the group;
+        """
+        self._attr_cache.clear()
+        for pv in pvs:
+            pv._attr_cache.clear()
 
     def append_lv(self, lv):
         """
@@ -248,6 +405,7 @@ class VolumeGroup(object):
             raise TypeError("Need a PhysicalVolume object")
         cmd = "lvm vgreduce %s %s %s" % (extra_args, self.name, pv.name)
         process.system(cmd)
+        self._clear_attr_cache([pv])
         self.pvs.remove(pv)
         LOG.info("reduce volume %s from volume group %s" % (pv.name, self.name))
 
@@ -262,6 +420,7 @@ class VolumeGroup(object):
             raise TypeError("Need a PhysicalVolume object")
         cmd = "lvm vgextend %s %s" % (self.name, pv.name)
         process.system(cmd)
+        self._clear_attr_cache([pv])
         self.pvs.append(pv)
         LOG.info("add volume %s to volumegroup %s" % (pv.name, self.name))
 
@@ -271,8 +430,9 @@ class VolumeGroup(object):
 
         :return: bool type, if exists True else False;
         """
-        vg_name = self.get_attr("vg_name")
-        return bool(vg_name)
+        # Not cached, the group may be removed behind this object
+        cmd = "lvm vgs -o vg_name %s %s" % (COMMON_OPTS, self.name)
+        return bool(cmd_output(cmd))
 
 
 class LogicalVolume(Volume):
@@ -293,25 +453,35 @@ class LogicalVolume(Volume):
         if self.lv_extra_options:
             cmd += " %s" % self.lv_extra_options
         process.system(cmd)
+        self._attr_cache.clear()
+        self.vg._attr_cache.clear()
         LOG.info("create logical volume %s", self.path)
         return self.get_attr("lv_path")
 
-    def remove(self, extra_args="-ff --yes", timeout=300):
+    def remove(self, extra_args="-ff --yes", timeout=300, mount_index=None):
         """
         Remove LogicalVolume device;
 
         :param extra_args: extra arguments pass to lvm command;
         :param timeout: timeout in seconds;
+        :param mount_index: mount index passed to umount();
         """
         end_time = time.time() + timeout
+        delay = 0.05
         while time.time() < end_time:
-            self.umount()
+            self.umount(mount_index=mount_index)
             cmd = "lvm lvremove %s %s/%s" % (extra_args, self.vg.name, self.name)
-            status = process.system(cmd, ignore_status=True)
-            if status == 0:
+            result = process.run(cmd, ignore_status=True)
+            if result.exit_status == 0:
+                self._attr_cache.clear()
+                self.vg._attr_cache.clear()
                 LOG.info("logical volume(%s) removed", self.name)
                 break
-            time.sleep(0.5)
+            if "in use" in result.stderr_text:
+                # Mostly udev still holds the device, wait for its events
+                process.system("udevadm settle --timeout=1", ignore_status=True)
+            time.sleep(random.uniform(delay / 2, delay))
+            delay = min(delay * 2, 2.0)
 
     def resize(self, size, extra_args="-ff"):
         """
@@ -331,6 +501,8 @@ class LogicalVolume(Volume):
             size = normalize_data_size(size)
         cmd = "lvm lvresize -n -L %s%s %s %s" % (size, UNIT, path, extra_args)
         process.system(cmd)
+        self._attr_cache.clear()
+        self.vg._attr_cache.clear()
         self.size = size
         LOG.info("resize logical volume %s size to %s" % (self.path, self.size))
         return size
@@ -360,19 +532,28 @@ class LogicalVolume(Volume):
 
 class LVM(object):
     def __init__(self, params):
-        path.find_command("lvm")
+        _find_command("lvm")
         self.params = self.__format_params(params)
-        self.pvs = self.__reload_pvs()
-        self.vgs = self.__reload_vgs()
-        self.lvs = self.__reload_lvs()
+        if self.params.get("lvm_prime_cache") == "yes":
+            process.system("lvm pvscan --cache", ignore_status=True)
+        volumes = self.__reload_all()
+        if volumes is None:
+            self.pvs = self.__reload_pvs()
+            self.vgs = self.__reload_vgs()
+            self.lvs = self.__reload_lvs()
+        else:
+            self.pvs, self.vgs, self.lvs = volumes
         self.trash = []
+        self.trash_lock = threading.Lock()
+        # Whether volumes changed since the last rescan
+        self._dirty = True
+        self._last_rescan = 0.0
 
     def generate_id(self, params):
         """
         Create prefix with image_name;
         """
-        black_str = re.compile(r"[-./]")
-        return black_str.sub("_", os.path.basename(params["image_name"]))
+        return _image_id(params["image_name"])
 
     def __format_params(self, params):
         """
@@ -387,17 +568,18 @@ class LVM(object):
         params["lv_size"] = normalize_data_size(lv_size)
 
         lv_name = params.get("lv_name")
-        if lv_name is None:
-            lv_name = "lv_%s" % self.generate_id(params)
-            params["lv_name"] = lv_name
-
         vg_name = params.get("vg_name")
-        if vg_name is None:
-            vg_name = "vg_%s" % self.generate_id(params)
-            params["vg_name"] = vg_name
+        if lv_name is None or vg_name is None:
+            image_id = self.generate_id(params)
+            if lv_name is None:
+                lv_name = "lv_%s" % image_id
+                params["lv_name"] = lv_name
+            if vg_name is None:
+                vg_name = "vg_%s" % image_id
+                params["vg_name"] = vg_name
         if lv_name.startswith("/dev"):
             if "mapper" not in lv_name:
-                match = re.search("/dev/([\w_]+)/([\w_]+)", lv_name)
+                match = _LV_PATH_RE.search(lv_name)
                 vg_name, lv_name = [x[1:] for x in match.groups()]
                 params["lv_name"] = lv_name
                 params["vg_name"] = vg_name
@@ -410,7 +592,9 @@ class LVM(object):
         :param vol: Volume object or VolumeGroup objects
         """
         if isinstance(vol, Volume) or isinstance(vol, VolumeGroup):
-            self.trash.append(vol)
+            with self.trash_lock:
+                self.trash.append(vol)
+            self._dirty = True
             LOG.info("Install new volume %s", vol.name)
 
     def unregister(self, vol):
@@ -419,9 +603,59 @@ class LVM(object):
 
         :param vol: Volume object or VolumeGroup objects
         """
-        if vol in self.trash:
+        with self.trash_lock:
+            if vol not in self.trash:
+                return
             self.trash.remove(vol)
-            LOG.info("Uninstall volume %s", vol.name)
+        self._dirty = True
+        LOG.info("Uninstall volume %s", vol.name)
+
+    def __reload_all(self):
+        """
+        Create PhysicalVolume, VolumeGroup and LogicalVolume objects for
+        exist volumes with a single lvm fullreport call;
+
+        :return: tuple of (pvs, vgs, lvs) lists of Volume object, None if
+                 lvm fullreport is not available
+        """
+        result = process.run(FULLREPORT_CMD, ignore_status=True)
+        if result.exit_status != 0:
+            LOG.debug("lvm fullreport failed, query pvs/vgs/lvs one by one")
+            return None
+        try:
+            reports = json.loads(result.stdout_text)["report"]
+        except (ValueError, KeyError):
+            LOG.debug("Unexpected lvm fullreport output, query pvs/vgs/lvs one by one")
+            return None
+        pv_rows = []
+        vg_rows = []
+        lv_rows = []
+        for report in reports:
+            pv_rows.extend(report.get("pv", []))
+            vg_rows.extend(report.get("vg", []))
+            lv_rows.extend(report.get("lv", []))
+        pvs = []
+        vg_pvs = {}
+        for row in pv_rows:
+            pv = PhysicalVolume(row["pv_name"], row["pv_size"])
+            vg_pvs.setdefault(row["vg_name"], []).append(pv)
+            pvs.append(pv)
+        vgs = []
+        vg_map = {}
+        for row in vg_rows:
+            vg_name = row["vg_name"]
+            vg = VolumeGroup(vg_name, row["vg_size"], vg_pvs.get(vg_name, []))
+            for pv in vg.pvs:
+                pv.set_vg(vg)
+            vg_map[vg_name] = vg
+            vgs.append(vg)
+        lvs = []
+        for row in lv_rows:
+            vg = vg_map[row["vg_name"]]
+            lv = LogicalVolume(row["lv_name"], row["lv_size"], vg)
+            vg.append_lv(lv)
+            lvs.append(lv)
+        return pvs, vgs, lvs
 
     def __reload_lvs(self):
         """
@@ -500,7 +734,8 @@ class LVM(object):
             pv = self.get_vol(pv_name, "pvs")
             if pv is None:
                 pv = PhysicalVolume(pv_name, 0)
-                pv.create()
+                # A new vg initializes its pvs with the vgcreate command
+                pv.create(defer=vg is None)
                 self.register(pv)
                 self.pvs.append(pv)
             pv.set_vg(vg)
@@ -568,6 +803,7 @@ class LVM(object):
                 "lv size(%s) mismath," % lv.size + "required size %s;" % lv_size
             )
             lv.resize(lv_size)
+            self._dirty = True
         return lv
 
     def setup(self):
@@ -587,35 +823,76 @@ class LVM(object):
         if self.params.get("force_remove_image", "no") == "yes":
             self.trash.reverse()
             trash = self.trash[:]
-            for vol in trash:
-                if isinstance(vol, LogicalVolume):
-                    vol.umount()
-                if isinstance(vol, PhysicalVolume):
-                    vg = vol.vg
-                    if vg is not None:
-                        vg.reduce_pv(vol)
-                if isinstance(vol, VolumeGroup):
-                    for pv in self.pvs:
-                        if pv.vg is vol:
-                            pv.vg = None
-                vol.remove()
-                self.unregister(vol)
+            mount_index = _get_mount_index()
+            # Volumes of one kind don't depend on each other, so remove
+            # them concurrently, but all lvs before vgs and vgs before pvs
+            for vol_type in (LogicalVolume, VolumeGroup, PhysicalVolume):
+                vols = [vol for vol in trash if isinstance(vol, vol_type)]
+                for index in range(0, len(vols), CLEANUP_WORKERS):
+                    threads = [
+                        utils_misc.InterruptedThread(
+                            self.remove_volume, (vol, mount_index)
+                        )
+                        for vol in vols[index : index + CLEANUP_WORKERS]
+                    ]
+                    for thread in threads:
+                        thread.start()
+                    # Join every removal before raising the first error, so
+                    # none keeps running behind the caller
+                    error = None
+                    for thread in threads:
+                        try:
+                            thread.join()
+                        except Exception as details:
+                            if error is None:
+                                error = details
+                    if error is not None:
+                        raise error
         self.rescan()
 
+    def remove_volume(self, vol, mount_index=None):
+        """
+        Remove a volume created by this instance and unregister it;
+
+        :param vol: Volume object or VolumeGroup objects
+        :param mount_index: mount index used to unmount logical volumes;
+        """
+        if isinstance(vol, PhysicalVolume):
+            vg = vol.vg
+            if vg is not None:
+                vg.reduce_pv(vol)
+        if isinstance(vol, VolumeGroup):
+            for pv in self.pvs:
+                if pv.vg is vol:
+                    pv.vg = None
+        if isinstance(vol, LogicalVolume):
+            vol.remove(mount_index=mount_index)
+        else:
+            vol.remove()
+        self.unregister(vol)
+
     def rescan(self):
         """
         Rescan lvm , used before create volume or after remove volumes;
+
+        Skipped if no volume changed since a reload done in the last
+        RESCAN_INTERVAL seconds;
         """
         lvm_reload_cmd = self.params.get("lvm_reload_cmd")
         if lvm_reload_cmd:
+            elapsed = time.monotonic() - self._last_rescan
+            if not self._dirty and elapsed < RESCAN_INTERVAL:
+                return
             process.system(lvm_reload_cmd, ignore_status=True)
+            self._dirty = False
+            self._last_rescan = time.monotonic()
             LOG.info("reload lvm monitor service")
 
 
 class EmulatedLVM(LVM):
     def __init__(self, params, root_dir=data_dir.get_tmp_dir()):
-        path.find_command("losetup")
-        path.find_command("dd")
+        _find_command("losetup")
+        _find_command("dd")
         super(EmulatedLVM, self).__init__(params)
         self.data_dir = root_dir
 
@@ -627,15 +904,34 @@ class EmulatedLVM(LVM):
 
     def make_emulate_image(self):
         """
-        Create emulate image via dd with 8M block size;
+        Create emulate image sized in 8M blocks;
+
+        The image is preallocated with posix_fallocate(), or left sparse
+        if params["emulated_image_sparse"] is "yes".  Zeros are written
+        with dd only when the filesystem can't preallocate.
         """
         img_size = self.params["lv_size"]
         img_path = self.get_emulate_image_name()
         bs_size = normalize_data_size("8M")
         count = int(math.ceil(img_size / bs_size)) + 8
         LOG.info("create emulated image file(%s)" % img_path)
-        cmd = "dd if=/dev/zero of=%s bs=8M count=%s" % (img_path, count)
-        process.system(cmd)
+        use_dd = False
+        fd = os.open(img_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o644)
+        try:
+            if self.params.get("emulated_image_sparse", "no") == "yes":
+                os.ftruncate(fd, count * bs_size)
+            else:
+                try:
+                    os.posix_fallocate(fd, 0, count * bs_size)
+                except OSError as details:
+                    if details.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                        raise
+                    use_dd = True
+        finally:
+            os.close(fd)
+        if use_dd:
+            cmd = "dd if=/dev/zero of=%s bs=8M count=%s" % (img_path, count)
+            process.system(cmd)
         self.params["pv_size"] = count * bs_size
         return img_path
 
@@ -657,10 +953,8 @@ class EmulatedLVM(LVM):
         """
         pvs = []
         emulate_image_file = self.get_emulate_image_name()
-        cmd = "losetup -j %s" % emulate_image_file
-        output = process.run(cmd).stdout_text
         try:
-            pv_name = re.findall("(/dev/loop\d+)", output, re.M | re.I)[-1]
+            pv_name = _find_loop_devices(emulate_image_file)[-1]
             pv = self.get_vol(pv_name, "pvs")
         except IndexError:
             pv = None
@@ -669,7 +963,7 @@ class EmulatedLVM(LVM):
             pv_name = self.make_volume(img_file)
             pv_size = self.params["pv_size"]
             pv = PhysicalVolume(pv_name, pv_size)
-            pv.create()
+            pv.create(defer=vg is None)
             self.register(pv)
             self.pvs.append(pv)
         else:
@@ -702,10 +996,7 @@ class EmulatedLVM(LVM):
         super(EmulatedLVM, self).cleanup()
         if self.params.get("remove_emulated_image", "no") == "yes":
             emulate_image_file = self.get_emulate_image_name()
-            cmd = "losetup -j %s" % emulate_image_file
-            output = process.run(cmd).stdout_text
-            devices = re.findall("(/dev/loop\d+)", output, re.M | re.I)
-            for dev in devices:
+            for dev in _find_loop_devices(emulate_image_file):
                 cmd = "losetup -d %s" % dev
                 LOG.info("disconnect %s", dev)
                 process.system(cmd, ignore_status=True)
@@ -141,21 +141,23 @@ class PropCanBase(dict, PropCanInternal):
     @classproperty
     @classmethod
     def __all_slots__(cls):
-        if not cls.___all_slots__:
+        # Look in the class's own namespace, an inherited cache
+        # would hold the parent's slots only.
+        all_slots = cls.__dict__.get("___all_slots__")
+        if all_slots is None:
             all_slots = []
             for cls_slots in [getattr(_cls, "__slots__", []) for _cls in cls.__mro__]:
                 all_slots += cls_slots
-            cls.___all_slots__ = tuple(all_slots)
-        return cls.___all_slots__
+            all_slots = tuple(all_slots)
+            cls.___all_slots__ = all_slots
+        return all_slots
 
     def __new__(cls, *args, **dargs):
         if not hasattr(cls, "__slots__"):
             raise NotImplementedError(
                 "Class '%s' must define __slots__ " "property" % str(cls)
             )
-        newone = super(PropCanBase, cls).__new__(cls, *args, **dargs)
-        cls.___all_slots__ = tuple()
-        return newone
+        return super(PropCanBase, cls).__new__(cls, *args, **dargs)
 
     def __init__(self, *args, **dargs):
         """
@@ -345,6 +345,23 @@ class XMLTreeFile(ElementTree.ElementTree, XMLBackup):
             path = "." + path
         return super().find(path)
 
+    # ElementTree rewrites absolute paths itself, but emits a FutureWarning
+    # on every call while doing so; normalize them up front instead.
+    def findall(self, path, namespaces=None):
+        if path[:1] == "/":
+            path = "." + path
+        return super().findall(path, namespaces)
+
+    def iterfind(self, path, namespaces=None):
+        if path[:1] == "/":
+            path = "." + path
+        return super().iterfind(path, namespaces)
+
+    def findtext(self, path, default=None, namespaces=None):
+        if path[:1] == "/":
+            path = "." + path
+        return super().findtext(path, default, namespaces)
+
 
 class Sub(object):
     """String substituter using string.Template"""